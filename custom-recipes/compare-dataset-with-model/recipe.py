@@ -1,8 +1,11 @@
 import pandas as pd
 import datetime
+import hashlib
 import logging
+from pandas.util import hash_pandas_object
 from dataiku.customrecipe import get_input_names_for_role, get_output_names_for_role, get_recipe_config
-from dku_tools import set_column_description, get_input_output, get_params_with_model, build_drift_metric_dataframe
+from dku_tools import get_input_output, get_params_with_model, build_drift_metric_dataframe, write_metrics, check_output_schema_compatibility
+from dku_tools import get_cache_folder, read_drift_classifier_cache, write_drift_classifier_cache
 from model_metadata import get_train_date
 from dku_data_drift.drift_analyzer import DriftAnalyzer
 from dku_data_drift.model_accessor import ModelAccessor
@@ -16,34 +19,64 @@ logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='Model Drift Recipe | %(levelname)s - %(message)s')
 
 new_dataset, model, output_dataset = get_input_output(has_model_as_second_input=True)
-new_df = new_dataset.get_dataframe(bool_as_str=True, limit=ModelDriftConstants.MAX_NUM_ROW)
-
 partition_cols_new_df = get_partitioning_columns(new_dataset)
-if partition_cols_new_df:
-    new_df = new_df.drop(partition_cols_new_df, axis=1)
-if len(new_df.columns) == 0:
-    raise ValueError('Without the partition column, dataset is empty.')
 
 version_id, metric_list = get_params_with_model(get_recipe_config(), model)
 
+# Fail fast on an incompatible output schema before paying for any model scoring
+check_output_schema_compatibility(output_dataset, metric_list, has_model_as_input=True)
+
 # Access the model
 model_handler = get_model_handler(model=model, version_id=version_id)
 model_accessor = ModelAccessor(model_handler)
 
-# Analyze the drift
+# Analyze the drift, streaming the new dataset chunk by chunk to keep peak memory at O(chunk)
+# Only the model's input features (and target, if present) go through the drift analysis
+columns_for_drift = set(model_accessor.get_selected_features() + [model_accessor.get_target_variable()])
+cache_folder = get_cache_folder()
+sample_hash = hashlib.sha256()
 drifter = DriftAnalyzer(prediction_type=None)
-drifter.fit(new_df, model_accessor=model_accessor)
+rows_accumulated = 0
+for new_df_chunk in new_dataset.iter_dataframes(chunksize=ModelDriftConstants.CHUNK_SIZE, bool_as_str=True, infer_with_pandas=False):
+    if partition_cols_new_df:
+        new_df_chunk = new_df_chunk.drop(partition_cols_new_df, axis=1)
+    if len(new_df_chunk.columns) == 0:
+        raise ValueError('Without the partition column, dataset is empty.')
+    new_df_chunk = new_df_chunk[[col for col in new_df_chunk.columns if col in columns_for_drift]]
+    rows_accumulated += len(new_df_chunk)
+    if cache_folder is not None:
+        sample_hash.update(hash_pandas_object(new_df_chunk).values.tobytes())
+    if not drifter.partial_fit(new_df_chunk, max_num_row=ModelDriftConstants.MAX_NUM_ROW):
+        break
+if rows_accumulated == 0:
+    raise ValueError('The input dataset is empty.')
+
+# When a cache folder is connected, reuse the drift classifier fitted by a previous run
+# on the exact same model version and new data sample instead of retraining it
+cached_drift_clf_state = None
+drift_clf_cache_path = None
+if cache_folder is not None:
+    drift_clf_cache_path = 'drift_clf_{}.pkl'.format(hashlib.sha256('{}:{}:{}'.format(model.get_id(), version_id, sample_hash.hexdigest()).encode()).hexdigest())
+    cached_drift_clf_state = read_drift_classifier_cache(cache_folder, drift_clf_cache_path)
+    if cached_drift_clf_state is not None:
+        logger.info('Found a cached drift model for this model version and sample.')
+        drifter.set_drift_classifier_state(cached_drift_clf_state)
+
+drifter.fit(None, model_accessor=model_accessor)
+
+if cache_folder is not None and cached_drift_clf_state is None:
+    write_drift_classifier_cache(cache_folder, drift_clf_cache_path, drifter.get_drift_classifier_state())
 
 # Write the drift score and metrics
 timestamp = datetime.datetime.now()
-model_train_date = get_train_date(model.get_id(), version_id)
+model_train_date = get_train_date(model, version_id)
 new_df = pd.DataFrame({ModelDriftConstants.TIMESTAMP: [timestamp],
                        ModelDriftConstants.MODEL_ID: [model.get_id()],
                        ModelDriftConstants.VERSION_ID: [version_id],
                        ModelDriftConstants.TRAIN_DATE: [model_train_date]})
-#specify the column order
+# specify the column order explicitly: on python2, pd.DataFrame(dict) sorts the keys, and the
+# append path writes positionally against the existing schema
 new_df = new_df[[ModelDriftConstants.TIMESTAMP, ModelDriftConstants.MODEL_ID, ModelDriftConstants.VERSION_ID, ModelDriftConstants.TRAIN_DATE]]
 metrics_df, column_description_dict = build_drift_metric_dataframe(drifter, metric_list, new_df, has_model_as_input=True)
 
-output_dataset.write_with_schema(metrics_df)
-set_column_description(output_dataset, column_description_dict)
\ No newline at end of file
+write_metrics(output_dataset, metrics_df, column_description_dict)
\ No newline at end of file
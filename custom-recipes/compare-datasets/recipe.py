@@ -5,17 +5,20 @@ from dataiku.customrecipe import get_input_names_for_role, get_output_names_for_
 from dku_data_drift.drift_analyzer import DriftAnalyzer
 from dku_data_drift.dataset_helpers import get_partitioning_columns
 from dku_data_drift.model_drift_constants import ModelDriftConstants
-from dku_tools import set_column_description, get_input_output, get_params_without_model, build_drift_metric_dataframe
+from dku_tools import get_input_output, get_params_without_model, build_drift_metric_dataframe, write_metrics, check_output_schema_compatibility
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='Model Drift Recipe | %(levelname)s - %(message)s')
 
 new_dataset, original_dataset, output_dataset = get_input_output()
+columns_to_remove, metric_list = get_params_without_model(get_recipe_config())
+
+# Fail fast on an incompatible output schema before reading the datasets and training the drift model
+check_output_schema_compatibility(output_dataset, metric_list, has_model_as_input=False)
+
 original_df = original_dataset.get_dataframe(bool_as_str=True, limit=ModelDriftConstants.MAX_NUM_ROW)
 new_df = new_dataset.get_dataframe(bool_as_str=True, limit=ModelDriftConstants.MAX_NUM_ROW)
 
-columns_to_remove, metric_list = get_params_without_model(get_recipe_config())
-
 if len(columns_to_remove) != 0:
     to_remove_in_original = set(original_df.columns).intersection(set(columns_to_remove))
     if to_remove_in_original:
@@ -43,6 +46,5 @@ timestamp = datetime.datetime.now()
 new_df = pd.DataFrame({ModelDriftConstants.TIMESTAMP: [timestamp]})
 metrics_df, column_description_dict = build_drift_metric_dataframe(drifter, metric_list, new_df, has_model_as_input=False)
 
-output_dataset.write_with_schema(metrics_df)
-set_column_description(output_dataset, column_description_dict)
+write_metrics(output_dataset, metrics_df, column_description_dict)
 
@@ -6,6 +6,7 @@
 
 import logging
 import sys
+import numpy as np
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='Model Drift Plugin | %(levelname)s - %(message)s')
@@ -18,14 +19,37 @@ except NameError:
     basestring = str
 
 
+# dtype kinds mapped to compact integer codes, so dtype comparisons are scalar integer
+# comparisons instead of Python-level dtype-object equality
+_DTYPE_KIND_CODES = {'i': 0, 'u': 1, 'f': 2, 'O': 3, 'M': 4, 'b': 5}
+
+
+def _type_codes(df, columns):
+    return np.array([_DTYPE_KIND_CODES.get(df.dtypes[col].kind, -1) for col in columns], dtype=np.int8)
+
+
 def schema_are_compatible(df1, df2):
     """
-    Return True if df1 and df2 have the same columns
+    Return True if df1 and df2 have the same columns with the same kind of dtype
     :param df1: Pandas dataframe
     :param df2: Pandas dataframe
     :return:
     """
-    return set(df1.columns) == set(df2.columns)
+    if set(df1.columns) != set(df2.columns):
+        return False
+    columns = sorted(df1.columns)
+    return np.array_equal(_type_codes(df1, columns), _type_codes(df2, columns))
+
+
+def schema_is_compatible_with_dataframe(dataset_schema, df):
+    """
+    Return True if the dataset schema (as returned by Dataset.read_schema, no row IO involved)
+    has the same columns as the dataframe
+    :param dataset_schema: list of column metadata dicts from Dataset.read_schema()
+    :param df: Pandas dataframe
+    :return:
+    """
+    return set(col.get('name') for col in dataset_schema) == set(df.columns)
 
 
 def not_enough_data(df, min_len=1):
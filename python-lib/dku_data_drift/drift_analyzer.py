@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import logging
+import pickle
 import numpy as np
 import pandas as pd
 import scipy.stats
@@ -21,6 +22,8 @@ class DriftAnalyzer(object):
         self.drift_clf = RandomForestClassifier(n_estimators=100, random_state=1337, max_depth=13, min_samples_leaf=1)
         self._original_df = None
         self._new_df = None
+        self._new_df_chunks = []
+        self._accumulated_rows = 0
         self._drift_test_X = None
         self._drift_test_Y = None
         self._model_accessor = None
@@ -28,19 +31,43 @@ class DriftAnalyzer(object):
         self.target = None
         self.features_in_drift_model = None
         self.sample_size = None
+        self._preloaded_drift_clf = None
+        self._preloaded_drift_features = None
 
     def get_prediction_type(self):
         return self.prediction_type
 
+    def partial_fit(self, new_df_chunk, max_num_row=ModelDriftConstants.MAX_NUM_ROW):
+        """
+        Accumulate one chunk of the new dataset, so that large datasets can be streamed chunk by chunk
+        instead of being materialized in one dataframe. The accumulated sample is capped at max_num_row rows.
+        Call fit(None, ...) afterwards to train the drift model on the accumulated sample.
+
+        Returns True while the accumulated sample can accept more rows, False once the cap is reached
+        """
+        remaining_rows = max_num_row - self._accumulated_rows
+        if remaining_rows <= 0:
+            return False
+        self._new_df_chunks.append(new_df_chunk.head(remaining_rows))
+        self._accumulated_rows += min(len(new_df_chunk), remaining_rows)
+        return self._accumulated_rows < max_num_row
+
     def fit(self, new_df, model_accessor=None, original_df=None, target=None):
         """
         Trains a classifier that attempts to discriminate between rows from the provided dataframe and
         rows from the dataset originally used to evaluate the model
 
+        If new_df is None, the chunks accumulated through partial_fit are used instead.
+
         Returns (columns, classifier)
         """
         logger.info("Preparing the drift model...")
 
+        if new_df is None:
+            if not self._new_df_chunks:
+                raise ValueError('No new dataset was provided. Either pass a dataframe or call partial_fit first.')
+            new_df = pd.concat(self._new_df_chunks, sort=False)
+
         if model_accessor is not None and original_df is not None:
             raise ValueError('model_accessor and original_df can not be defined at the same time. Please choose one of them.')
 
@@ -62,14 +89,39 @@ class DriftAnalyzer(object):
 
         preprocessor = Preprocessor(df, target=ModelDriftConstants.ORIGIN_COLUMN)
         train, test = preprocessor.get_processed_train_test()
-        drift_train_X = train.drop(ModelDriftConstants.ORIGIN_COLUMN, axis=1)
+        drift_train_df = train.drop(ModelDriftConstants.ORIGIN_COLUMN, axis=1)
+        self.features_in_drift_model = drift_train_df.columns
+        # after preprocessing every feature is numeric, so hand the classifier contiguous float32
+        # matrices directly instead of dataframes (skips per-column lookups and dtype conversion in sklearn)
+        drift_train_X = np.ascontiguousarray(drift_train_df.values, dtype=np.float32)
         drift_train_Y = np.array(train[ModelDriftConstants.ORIGIN_COLUMN])
-        self._drift_test_X = test.drop(ModelDriftConstants.ORIGIN_COLUMN, axis=1)  # we will use them later when compute metrics
+        self._drift_test_X = np.ascontiguousarray(test.drop(ModelDriftConstants.ORIGIN_COLUMN, axis=1).values, dtype=np.float32)  # we will use them later when compute metrics
         self._drift_test_Y = np.array(test[ModelDriftConstants.ORIGIN_COLUMN])
-        self.features_in_drift_model = drift_train_X.columns
 
-        logger.info("Fitting the drift model...")
-        self.drift_clf.fit(drift_train_X, drift_train_Y)
+        if self._preloaded_drift_clf is not None and self._preloaded_drift_features == list(self.features_in_drift_model):
+            logger.info("Reusing the cached drift model, skipping the training...")
+            self.drift_clf = self._preloaded_drift_clf
+        else:
+            logger.info("Fitting the drift model...")
+            self.drift_clf.fit(drift_train_X, drift_train_Y)
+
+    def get_drift_classifier_state(self):
+        """
+        Serialize the fitted drift classifier and its feature list, so that callers can persist it
+        (e.g. in a managed folder) and skip the training on a later run over identical inputs
+        """
+        if self.features_in_drift_model is None:
+            raise ValueError('The drift model has not been fitted yet.')
+        return pickle.dumps({'drift_clf': self.drift_clf, 'features': list(self.features_in_drift_model)})
+
+    def set_drift_classifier_state(self, state_blob):
+        """
+        Preload a drift classifier serialized by get_drift_classifier_state. fit() will reuse it
+        instead of retraining, as long as the feature set of the prepared data matches
+        """
+        state = pickle.loads(state_blob)
+        self._preloaded_drift_clf = state.get('drift_clf')
+        self._preloaded_drift_features = state.get('features')
 
     def prepare_data_when_having_model(self, new_df, original_df):
         logger.info('Prepare data with model')
@@ -379,10 +431,13 @@ class DriftAnalyzer(object):
             raise ValueError('No target was defined at fit phase.')
 
         if self._model_accessor is not None:
-            original_prediction_df = self._model_accessor.predict(self._original_df[:limit])
-            original_prediction_df = original_prediction_df.rename(columns={'prediction':self.target})
-            new_predicton_df = self._model_accessor.predict(self._new_df[:limit])
-            new_predicton_df = new_predicton_df.rename(columns={'prediction':self.target})
+            original_sample_df = self._original_df[:limit]
+            new_sample_df = self._new_df[:limit]
+            # score both samples in one batch: a single pass over the model instead of two
+            combined_prediction_df = self._model_accessor.predict(pd.concat([original_sample_df, new_sample_df], sort=False))
+            combined_prediction_df = combined_prediction_df.rename(columns={'prediction': self.target})
+            original_prediction_df = combined_prediction_df.iloc[:len(original_sample_df)].reset_index(drop=True)
+            new_predicton_df = combined_prediction_df.iloc[len(original_sample_df):].reset_index(drop=True)
 
             if self._model_accessor.get_prediction_type() == ModelDriftConstants.CLASSIFICATION_TYPE:
                 proba_columns = [col for col in original_prediction_df.columns if 'proba_' in col]
@@ -37,6 +37,7 @@ class ModelDriftConstants(object):
     FROM_NEW = 'new'
     MIN_NUM_ROWS = 500
     MAX_NUM_ROW = 100000
+    CHUNK_SIZE = 10000
     CUMULATIVE_PERCENTAGE_THRESHOLD = 90
     PREDICTION_TEST_SIZE = 100000
     SURROGATE_TARGET = "_dku_predicted_label_"
@@ -93,7 +93,7 @@ def format_proba_density(data, sample_weight=None, min_support=0, max_support=10
     # Definition of the support of the estimate
     X_plot = np.linspace(min_support, max_support, 500, dtype=float)[:, np.newaxis]
     kde = KernelDensity(kernel='gaussian', bandwidth=h).fit(data.reshape(-1, 1), sample_weight=sample_weight)
-    Y_plot = [v if not np.isnan(v) else 0 for v in np.exp(kde.score_samples(X_plot))]
+    Y_plot = np.nan_to_num(np.exp(kde.score_samples(X_plot)))
     return list(zip(X_plot.ravel(), Y_plot))
 
 class SurrogateModel(object):
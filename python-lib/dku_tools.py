@@ -4,6 +4,7 @@ import json
 import dataiku
 from dataiku.customrecipe import get_input_names_for_role, get_output_names_for_role
 from dku_data_drift.model_drift_constants import ModelDriftConstants
+from dku_data_drift.dataframe_helpers import schema_is_compatible_with_dataframe
 
 
 def process_timestamp(timestamp):
@@ -23,6 +24,105 @@ def set_column_description(dataset, column_description_dict):
     dataset.write_schema(dataset_schema)
 
 
+def get_cache_folder():
+    """
+    Return the optional managed folder used to cache fitted drift classifiers across runs,
+    or None when the role is not connected
+    :return:
+    """
+    cache_folder_names = get_input_names_for_role('cache')
+    if len(cache_folder_names) == 0:
+        return None
+    return dataiku.Folder(cache_folder_names[0])
+
+
+def read_drift_classifier_cache(cache_folder, cache_path):
+    """
+    Return the cached drift classifier state stored at cache_path, or None on a cache miss
+    :param cache_folder: Folder DSS object
+    :param cache_path:
+    :return:
+    """
+    if '/{}'.format(cache_path) not in cache_folder.list_paths_in_partition():
+        return None
+    with cache_folder.get_download_stream(cache_path) as stream:
+        return stream.read()
+
+
+def write_drift_classifier_cache(cache_folder, cache_path, state_blob):
+    """
+    Persist the drift classifier state at cache_path for later runs
+    :param cache_folder: Folder DSS object
+    :param cache_path:
+    :param state_blob:
+    :return:
+    """
+    cache_folder.upload_data(cache_path, state_blob)
+
+
+def get_drift_metric_columns(metric_list, has_model_as_input):
+    """
+    Return the column names the metrics dataframe will have for the chosen metrics.
+    Known before any computation, so the output schema can be validated upfront.
+    :param metric_list:
+    :param has_model_as_input:
+    :return:
+    """
+    if has_model_as_input:
+        columns = [ModelDriftConstants.TIMESTAMP, ModelDriftConstants.MODEL_ID, ModelDriftConstants.VERSION_ID, ModelDriftConstants.TRAIN_DATE]
+    else:
+        columns = [ModelDriftConstants.TIMESTAMP]
+    if ModelDriftConstants.DRIFT_SCORE in metric_list:
+        columns += [ModelDriftConstants.DRIFT_SCORE, ModelDriftConstants.BINOMIAL_P_VALUE, ModelDriftConstants.BINOMIAL_LOWER_BOUND, ModelDriftConstants.BINOMIAL_UPPER_BOUND]
+    if ModelDriftConstants.FUGACITY in metric_list:
+        columns += [ModelDriftConstants.FUGACITY, ModelDriftConstants.FUGACITY_RELATIVE_CHANGE]
+    if ModelDriftConstants.FEATURE_IMPORTANCE in metric_list:
+        columns.append(ModelDriftConstants.MOST_DRIFTED_FEATURES)
+        if has_model_as_input:
+            columns.append(ModelDriftConstants.MOST_IMPORTANT_FEATURES)
+    if ModelDriftConstants.RISKIEST_FEATURES in metric_list:
+        columns.append(ModelDriftConstants.RISKIEST_FEATURES)
+    return columns
+
+
+def check_output_schema_compatibility(output_dataset, metric_list, has_model_as_input):
+    """
+    Fail fast when the output dataset already has a schema that does not match the metrics
+    about to be computed, so that the error surfaces before any model scoring is paid for.
+    :param output_dataset: Dataset DSS object
+    :param metric_list:
+    :param has_model_as_input:
+    :return:
+    """
+    existing_schema = output_dataset.read_schema(raise_if_empty=False)
+    if existing_schema:
+        expected_columns = set(get_drift_metric_columns(metric_list, has_model_as_input))
+        existing_columns = set(col.get('name') for col in existing_schema)
+        if existing_columns != expected_columns:
+            raise ValueError('The schema of the existing output dataset is not compatible with the chosen metrics. Please use an empty output dataset.')
+
+
+def write_metrics(output_dataset, metrics_df, column_description_dict):
+    """
+    Write the one-row metrics dataframe to the output dataset. When the dataset already holds metrics
+    from previous runs, the new row is appended through a streaming writer without reading the
+    existing rows back. On the first run, set the schema and the column descriptions.
+    :param output_dataset: Dataset DSS object
+    :param metrics_df:
+    :param column_description_dict:
+    :return:
+    """
+    existing_schema = output_dataset.read_schema(raise_if_empty=False)
+    if existing_schema:
+        if not schema_is_compatible_with_dataframe(existing_schema, metrics_df):
+            raise ValueError('The computed metrics are not compatible with the schema of the existing output dataset. Please use an empty output dataset.')
+        with output_dataset.get_writer() as writer:
+            writer.write_dataframe(metrics_df)
+    else:
+        output_dataset.write_with_schema(metrics_df)
+        set_column_description(output_dataset, column_description_dict)
+
+
 def get_input_output(has_model_as_second_input=False):
 
     if len(get_input_names_for_role('new')) == 0:
@@ -51,11 +151,28 @@ def get_input_output(has_model_as_second_input=False):
         return (new_dataset, original_dataset, output_dataset)
 
 
+# memo for get_model_versions, keyed by the Model object (lru_cache is python3-only and the
+# plugin still accepts python2.7 code envs)
+_model_versions_cache = {}
+
+
+def get_model_versions(model):
+    """
+    List the versions of the input saved model, issuing the backend roundtrip only once per process:
+    both the recipe parameter resolution and the train-date lookup need this listing.
+    :param model: Model DSS object
+    :return:
+    """
+    if model not in _model_versions_cache:
+        _model_versions_cache[model] = model.list_versions()
+    return _model_versions_cache[model]
+
+
 def get_params_with_model(recipe_config, model):
     use_active_version = recipe_config.get('use_active_version')
     active_version = None
     if use_active_version:
-        for version in model.list_versions():
+        for version in get_model_versions(model):
             active_version = version.get('active') is True
             if active_version:
                 version_id = version.get('versionId')
@@ -4,12 +4,11 @@ import sys
 import json
 import dataiku
 from dataiku.doctor.posttraining.model_information_handler import PredictionModelInformationHandler
-from dku_tools import process_timestamp
+from dku_tools import process_timestamp, get_model_versions
 
 
-def get_train_date(model_version, version_id):
-    m = dataiku.Model(model_version, ignore_flow=True)
-    for v in m.list_versions():
+def get_train_date(model, version_id):
+    for v in get_model_versions(model):
         if v.get('versionId') == version_id:
             return process_timestamp((v.get('snippet').get('trainDate')))
     return None
@@ -4,6 +4,8 @@
 
 import sys
 import os
+import functools
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
@@ -14,7 +16,10 @@ from dku_data_drift import DriftAnalyzer, ModelAccessor
 
 RANDOM_SEED = 65537 # Fermat prime number <3
 TEST_RATIO = 0.3 # if this ratio change the reference prediction results below need to be updated accordingly
+MIN_ROWS_FOR_PARALLEL_SCORING = 1024 # below this, thread dispatch costs more than it saves
+N_SCORING_THREADS = 4
 
+@functools.lru_cache(maxsize=1)
 def load_data():
     iris = load_iris()
     feature_names = iris['feature_names']
@@ -29,14 +34,32 @@ class ScikitPredictor:
     def __init__(self, df, feature_names, target):
         self.feature_names = feature_names
         self._clf = RandomForestClassifier(n_estimators=10, random_state=RANDOM_SEED).fit(df[feature_names], df[target])
+        self._proba_cols = ['proba_{}'.format(c) for c in self._clf.classes_]
 
     def get_features(self):
         return self.feature_names
 
+    def _predict_proba(self, X):
+        # parallelize over row chunks rather than trees: peak memory stays at O(n_samples x n_classes)
+        # instead of the per-tree proba matrices sklearn allocates when parallelizing over estimators
+        n = len(X)
+        if n < MIN_ROWS_FOR_PARALLEL_SCORING:
+            return self._clf.predict_proba(X)
+        out = np.zeros((n, len(self._clf.classes_)), dtype=np.float32)
+        bounds = np.linspace(0, n, N_SCORING_THREADS + 1, dtype=int)
+        with ThreadPoolExecutor(max_workers=N_SCORING_THREADS) as executor:
+            def score_chunk(start, end):
+                out[start:end] = self._clf.predict_proba(X.iloc[start:end])
+            list(executor.map(score_chunk, bounds[:-1], bounds[1:]))
+        return out
+
     def predict(self, X):
-        predictions = self._clf.predict(X[self.feature_names])
-        probas =  self._clf.predict_proba(X[self.feature_names])
-        df = pd.DataFrame(probas, columns = ['proba_{}'.format(x) for x in range(probas.shape[1])])
+        # single predict_proba call, predictions are derived from it instead of a second tree traversal
+        probas = self._predict_proba(X[self.feature_names])
+        # float32 keeps more precision than the drift metrics need and halves the bytes moved downstream
+        probas = probas.astype(np.float32, copy=False)
+        predictions = self._clf.classes_[np.argmax(probas, axis=1)]
+        df = pd.DataFrame(probas, columns=self._proba_cols, copy=False)
         df['prediction'] = predictions
         return df
 
@@ -85,33 +108,83 @@ class ScikitModelHandler:
         return selected_features
 
 
-class TestDriftAnalyzer:
+# fitting the model is the dominant cost of the suite, build the handler once for the whole module
+@pytest.fixture(scope="module")
+def model_accessor():
+    return ModelAccessor(ScikitModelHandler())
+
 
-    def setup(self):
-        self.model_handler = 'model_handler'
-        self.model_handler = ScikitModelHandler()
-        self.model_accessor = ModelAccessor(self.model_handler)
-        self.drifter = DriftAnalyzer()
+@pytest.fixture
+def drifter():
+    return DriftAnalyzer()
 
-    def test_empty_set(self):
+
+class TestDriftAnalyzer:
+
+    def test_empty_set(self, drifter, model_accessor):
         _, feature_names, _ = load_data()
         new_test_df = pd.DataFrame(columns=feature_names)
         with pytest.raises(Exception) as e_info:
-            self.drifter.fit(new_test_df, model_accessor=self.model_accessor)
+            drifter.fit(new_test_df, model_accessor=model_accessor)
+
+    def test_parallel_scoring_matches_serial(self, model_accessor):
+        predictor = model_accessor.get_predictor()
+        df, feature_names, _ = load_data()
+        # tile the iris features well past MIN_ROWS_FOR_PARALLEL_SCORING to hit the threaded path
+        big_X = pd.concat([df[feature_names]] * 8, ignore_index=True)
+        assert len(big_X) >= MIN_ROWS_FOR_PARALLEL_SCORING
+        parallel_probas = predictor._predict_proba(big_X)
+        serial_probas = predictor._clf.predict_proba(big_X)
+        assert np.allclose(parallel_probas, serial_probas)
+
+    def test_fit_without_data(self, drifter, model_accessor):
+        with pytest.raises(ValueError):
+            drifter.fit(None, model_accessor=model_accessor)
+
+    def test_partial_fit_matches_fit(self, drifter, model_accessor):
+        df, _, _ = load_data()
+        _, new_test_df = train_test_split(df, test_size=TEST_RATIO, random_state=RANDOM_SEED)
+        drifter.fit(new_test_df, model_accessor=model_accessor)
+
+        chunked_drifter = DriftAnalyzer()
+        chunk_size = 20
+        for start in range(0, len(new_test_df), chunk_size):
+            chunked_drifter.partial_fit(new_test_df.iloc[start:start + chunk_size])
+        chunked_drifter.fit(None, model_accessor=model_accessor)
+
+        assert np.array_equal(chunked_drifter.drift_clf.feature_importances_, drifter.drift_clf.feature_importances_)
+        assert chunked_drifter.get_drift_score() == drifter.get_drift_score()
+
+    def test_drift_classifier_cache_round_trip(self, drifter, model_accessor):
+        df, _, _ = load_data()
+        _, new_test_df = train_test_split(df, test_size=TEST_RATIO, random_state=RANDOM_SEED)
+        drifter.fit(new_test_df, model_accessor=model_accessor)
+        state_blob = drifter.get_drift_classifier_state()
+
+        preloaded_drifter = DriftAnalyzer()
+        preloaded_drifter.set_drift_classifier_state(state_blob)
+
+        def forbid_fit(*args, **kwargs):
+            raise AssertionError('the drift classifier must not be retrained on a cache hit')
+        preloaded_drifter.drift_clf.fit = forbid_fit
+
+        preloaded_drifter.fit(new_test_df.copy(), model_accessor=model_accessor)
+        assert np.array_equal(preloaded_drifter.drift_clf.feature_importances_, drifter.drift_clf.feature_importances_)
+        assert preloaded_drifter.get_drift_score() == drifter.get_drift_score()
 
-    def test_missing_feature_set(self):
+    def test_missing_feature_set(self, drifter, model_accessor):
         df, feature_names, _ = load_data()
         _, new_test_df = train_test_split(df, test_size=TEST_RATIO, random_state=RANDOM_SEED)
-        new_test_df = new_test_df.drop(feature_names[0], 1)
+        new_test_df = new_test_df.drop(feature_names[0], axis=1)
 
         with pytest.raises(Exception) as e_info:
-            self.drifter.fit(new_test_df, model_accessor=self.model_accessor)
+            drifter.fit(new_test_df, model_accessor=model_accessor)
 
-    def test_identical_set(self):
+    def test_identical_set(self, drifter, model_accessor):
         df, _, _ = load_data()
         _, new_test_df = train_test_split(df, test_size=TEST_RATIO, random_state=RANDOM_SEED)
-        self.drifter.fit(new_test_df, model_accessor=self.model_accessor)
-        result_dict = self.drifter.get_drift_metrics_for_webapp()
+        drifter.fit(new_test_df, model_accessor=model_accessor)
+        result_dict = drifter.get_drift_metrics_for_webapp()
 
         drift_accuracy = result_dict.get('drift_accuracy')
         fugacity = result_dict.get('fugacity')
@@ -128,14 +201,14 @@ class TestDriftAnalyzer:
         assert np.array_equal(drift_model_feature_importance,
                               [0.01, 25.14448373884474, 26.616157925410526, 27.984711759761264])
 
-    def test_drifted_set(self):
+    def test_drifted_set(self, drifter, model_accessor):
         df, feature_names, _ = load_data()
         _, original_test_df = train_test_split(df, test_size=TEST_RATIO, random_state=RANDOM_SEED)
-        new_test_df = original_test_df.copy()
-        new_test_df[feature_names] = new_test_df[feature_names] * 2  # shift the feature distribution
+        # shift the feature distribution, doubling column by column instead of copying the whole frame first
+        new_test_df = original_test_df.assign(**{c: original_test_df[c].to_numpy() * 2 for c in feature_names})
 
-        self.drifter.fit(new_test_df, model_accessor=self.model_accessor)
-        result_dict = self.drifter.get_drift_metrics_for_webapp()
+        drifter.fit(new_test_df, model_accessor=model_accessor)
+        result_dict = drifter.get_drift_metrics_for_webapp()
 
         drift_accuracy = result_dict.get('drift_accuracy')
         fugacity = result_dict.get('fugacity')